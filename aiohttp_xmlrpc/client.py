@@ -1,3 +1,4 @@
+import asyncio
 import logging
 
 import aiohttp.client
@@ -5,8 +6,12 @@ from lxml import etree
 from multidict import MultiDict
 
 from . import __pyversion__, __version__, exceptions
-from .common import py2xml, schema, xml2py
+from .codec import decode_response
+from .common import dump_request, py2xml
+from .compression import GZIP, compress
 from .exceptions import xml2py_exception
+from .stream import StreamParser
+from .validation import VALIDATION_FULL, check_mode
 
 
 log = logging.getLogger(__name__)
@@ -26,15 +31,123 @@ class _Method:
         return self.__send(self.__name, *args, **kwargs)
 
 
+class _Stream:
+    # Namespace for "proxy.stream.method(...)" calls which
+    # return an async iterator over the response items
+    def __init__(self, send):
+        self.__send = send
+
+    def __getattr__(self, name):
+        return _Method(self.__send, name)
+
+
+class MultiCallResults:
+    """ Results of the :class:`MultiCall`. Faults are raised
+    as exceptions when the corresponding item is accessed. """
+
+    __slots__ = "results",
+
+    def __init__(self, results):
+        self.results = results
+
+    def __getitem__(self, idx):
+        item = self.results[idx]
+
+        if isinstance(item, dict):
+            raise xml2py_exception(
+                item.get("faultCode", exceptions.SystemError.code),
+                item.get("faultString", "Unknown error"),
+                default_exc_class=exceptions.ServerError,
+            )
+
+        if not isinstance(item, list) or len(item) != 1:
+            raise ValueError("Unexpected multicall result: %r" % (item,))
+
+        return item[0]
+
+    def __iter__(self):
+        for idx in range(len(self.results)):
+            yield self[idx]
+
+    def __len__(self):
+        return len(self.results)
+
+
+class MultiCall:
+    """ Collects the calls and sends them in a single
+    ``system.multicall`` request:
+
+    .. code-block:: python
+
+        multicall = MultiCall(proxy)
+        multicall.add(1, 2)
+        multicall.nested.method()
+        results = await multicall()
+
+    or, as a context manager, which sends the collected
+    calls on exit and keeps the results in ``results``:
+
+    .. code-block:: python
+
+        async with MultiCall(proxy) as multicall:
+            multicall.add(1, 2)
+
+        total = multicall.results[0]
+    """
+
+    def __init__(self, proxy):
+        self.__proxy = proxy
+        self.__calls = []
+        self.results = None
+
+    def __add(self, method_name, *args, **kwargs):
+        if kwargs:
+            args += (kwargs,)
+
+        self.__calls.append({"methodName": method_name, "params": list(args)})
+
+    def __getattr__(self, name):
+        return _Method(self.__add, name)
+
+    async def __call__(self):
+        calls, self.__calls = self.__calls, []
+
+        if not calls:
+            return MultiCallResults([])
+
+        return MultiCallResults(await self.__proxy.system.multicall(calls))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.results = await self()
+
+
 class ServerProxy(object):
-    __slots__ = "client", "url", "loop", "headers", "encoding", "huge_tree"
+    __slots__ = (
+        "client", "url", "loop", "headers", "encoding", "huge_tree",
+        "streaming", "serializer", "validation", "process_pool",
+        "coalesce_window", "coalesce_size", "_pending", "_flush_handle",
+        "compress_threshold", "compress_level", "compression",
+    )
 
     USER_AGENT = (
         "aiohttp XML-RPC client "
         "(Python: {0}, version: {1})"
     ).format(__pyversion__, __version__)
 
-    def __init__(self, url, client=None, headers=None, encoding=None, huge_tree=False, **kwargs):
+    # Request bodies bigger than this are compressed in the executor
+    COMPRESS_EXECUTOR_THRESHOLD = 64 * 1024
+
+    def __init__(
+        self, url, client=None, headers=None, encoding=None,
+        huge_tree=False, streaming=False, serializer="lxml",
+        validation=VALIDATION_FULL, process_pool=None,
+        coalesce_window=None, coalesce_size=64,
+        compress_threshold=None, compress_level=6, compression=GZIP, **kwargs
+    ):
         self.headers = MultiDict(headers or {})
 
         self.headers.setdefault("Content-Type", "text/xml")
@@ -42,6 +155,23 @@ class ServerProxy(object):
 
         self.encoding = encoding
         self.huge_tree = huge_tree
+        self.streaming = streaming
+        self.serializer = serializer
+        self.validation = check_mode(validation)
+        self.process_pool = process_pool
+
+        # Calls issued within coalesce_window seconds are merged
+        # into a single system.multicall request
+        self.coalesce_window = coalesce_window
+        self.coalesce_size = coalesce_size
+        self._pending = []
+        self._flush_handle = None
+
+        # Request bodies bigger than compress_threshold bytes
+        # are sent with Content-Encoding: compression
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+        self.compression = compression
 
         self.url = str(url)
         self.client = client or aiohttp.client.ClientSession(**kwargs)
@@ -74,30 +204,54 @@ class ServerProxy(object):
         return root
 
     def _parse_response(self, body, method_name):
+        if log.getEffectiveLevel() <= logging.DEBUG:
+            log.debug("Server response: \n%s", body.decode())
+
         try:
-            if log.getEffectiveLevel() <= logging.DEBUG:
-                log.debug("Server response: \n%s", body.decode())
+            params, fault = decode_response(
+                body, self.validation, self.huge_tree,
+            )
+        except etree.DocumentInvalid:
+            raise ValueError("Invalid body")
+
+        return self._make_result(method_name, params, fault)
 
-            parser = etree.XMLParser(huge_tree=self.huge_tree)
-            response = etree.fromstring(body, parser)
-            schema.assertValid(response)
+    async def _parse_body(self, body, method_name):
+        pool = self.process_pool
+
+        if pool is None or len(body) <= pool.threshold:
+            return self._parse_response(body, method_name)
+
+        try:
+            params, fault = await pool.decode_response(
+                body, self.validation, self.huge_tree,
+            )
         except etree.DocumentInvalid:
             raise ValueError("Invalid body")
 
-        result = response.xpath("//params/param/value")
-        if result:
-            if len(result) < 2:
-                return xml2py(result[0])
+        return self._make_result(method_name, params, fault)
+
+    async def _parse_stream(self, response, method_name):
+        parser = StreamParser(huge_tree=self.huge_tree)
+
+        async for chunk in response.content.iter_any():
+            parser.feed(chunk)
 
-            return [xml2py(item) for item in result]
+        decoder = parser.close()
+        return self._make_result(method_name, decoder.params, decoder.fault)
 
-        fault = response.xpath("//fault/value")
-        if fault:
-            err = xml2py(fault[0])
+    @staticmethod
+    def _make_result(method_name, params, fault=None):
+        if params:
+            if len(params) < 2:
+                return params[0]
+
+            return params
 
+        if fault is not None:
             raise xml2py_exception(
-                err.get("faultCode", exceptions.SystemError.code),
-                err.get("faultString", "Unknown error"),
+                fault.get("faultCode", exceptions.SystemError.code),
+                fault.get("faultString", "Unknown error"),
                 default_exc_class=exceptions.ServerError,
             )
 
@@ -106,24 +260,160 @@ class ServerProxy(object):
             "not contains any response.", method_name,
         )
 
+    def _build_request(self, method_name, *args, **kwargs):
+        if self.serializer == "text":
+            if kwargs:
+                args += (kwargs,)
+
+            return dump_request(method_name, args, encoding=self.encoding)
+
+        return etree.tostring(
+            self._make_request(method_name, *args, **kwargs),
+            xml_declaration=True,
+            encoding=self.encoding,
+        )
+
+    async def _compress_request(self, data):
+        if self.compress_threshold is None or len(data) < self.compress_threshold:
+            return data, self.headers
+
+        if len(data) > self.COMPRESS_EXECUTOR_THRESHOLD:
+            loop = asyncio.get_event_loop()
+            data = await loop.run_in_executor(
+                None, compress, data, self.compression, self.compress_level,
+            )
+        else:
+            data = compress(data, self.compression, self.compress_level)
+
+        headers = self.headers.copy()
+        headers["Content-Encoding"] = self.compression
+        return data, headers
+
+    async def __request(self, method_name, *args, **kwargs):
+        data, headers = await self._compress_request(
+            self._build_request(method_name, *args, **kwargs),
+        )
+
+        return self.client.post(str(self.url), data=data, headers=headers)
+
     async def __remote_call(self, method_name, *args, **kwargs):
-        async with self.client.post(
-            str(self.url),
-            data=etree.tostring(
-                self._make_request(method_name, *args, **kwargs),
-                xml_declaration=True,
-                encoding=self.encoding,
-            ),
-            headers=self.headers,
-        ) as response:
+        if self.coalesce_window is not None and method_name != "system.multicall":
+            return await self.__coalesce(method_name, *args, **kwargs)
+
+        return await self.__send(method_name, *args, **kwargs)
+
+    def __coalesce(self, method_name, *args, **kwargs):
+        if kwargs:
+            args += (kwargs,)
+
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self._pending.append((future, method_name, args))
+
+        if len(self._pending) >= self.coalesce_size:
+            self.__flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(
+                self.coalesce_window, self.__flush,
+            )
+
+        return future
+
+    def __flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        # Request bodies bigger than compress_threshold bytes
+        # are sent with Content-Encoding: compression
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+        self.compression = compression
+
+        pending, self._pending = self._pending, []
+
+        if pending:
+            asyncio.ensure_future(self.__send_pending(pending))
+
+    async def __send_pending(self, pending):
+        futures = [future for future, _, _ in pending]
+
+        try:
+            if len(pending) == 1:
+                _, method_name, args = pending[0]
+                results = [await self.__send(method_name, *args)]
+            else:
+                results = MultiCallResults(
+                    await self.__send("system.multicall", [
+                        {"methodName": method_name, "params": list(args)}
+                        for _, method_name, args in pending
+                    ]),
+                )
+
+                if len(results) != len(futures):
+                    raise exceptions.ParseError(
+                        "system.multicall returned %d results for %d calls" % (
+                            len(results), len(futures),
+                        ),
+                    )
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for idx, future in enumerate(futures):
+            if future.done():
+                continue
+
+            try:
+                future.set_result(results[idx])
+            except Exception as e:
+                future.set_exception(e)
+
+    async def __send(self, method_name, *args, **kwargs):
+        async with await self.__request(method_name, *args, **kwargs) as response:
             response.raise_for_status()
 
-            return self._parse_response((await response.read()), method_name)
+            if self.streaming:
+                return await self._parse_stream(response, method_name)
+
+            return await self._parse_body((await response.read()), method_name)
+
+    async def __stream_call(self, method_name, *args, **kwargs):
+        async with await self.__request(method_name, *args, **kwargs) as response:
+            response.raise_for_status()
+
+            parser = StreamParser(huge_tree=self.huge_tree, iterate=True)
+            items = parser.decoder.items
+
+            # The next chunk is read only when the consumer
+            # has taken all the items decoded so far
+            async for chunk in response.content.iter_any():
+                parser.feed(chunk)
+
+                while items:
+                    yield items.popleft()
+
+            decoder = parser.close()
+
+            while items:
+                yield items.popleft()
+
+            result = self._make_result(
+                method_name, decoder.params, decoder.fault,
+            )
+
+            # Arrays were already yielded item by item
+            if not isinstance(result, list):
+                yield result
 
     def __getattr__(self, method_name):
         # Trick to keep the "close" method available
         if method_name == "close":
             return self.__close
+        elif method_name == "stream":
+            return _Stream(self.__stream_call)
         else:
             # Magic method dispatcher
             return _Method(self.__remote_call, method_name)
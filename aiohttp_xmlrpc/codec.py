@@ -0,0 +1,202 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+
+from lxml import etree
+
+from .common import dump_response, py2xml, xml2py
+from .validation import (
+    VALIDATION_FULL, VALIDATION_STRUCTURAL, make_parser, parse_call,
+    parse_response, validate,
+)
+
+
+def parse_xml(body, validation=VALIDATION_FULL, **kwargs):
+    root = etree.fromstring(body, make_parser(**kwargs))
+    validate(root, validation)
+    return root
+
+
+def decode_call(body, validation=VALIDATION_FULL):
+    """ Returns the method name and the arguments of
+    the ``methodCall`` request body """
+
+    root = parse_xml(body, validation, resolve_entities=False)
+
+    if validation == VALIDATION_STRUCTURAL:
+        return parse_call(root)
+
+    method_name = root.xpath("//methodName[1]")[0].text
+    args = list(map(xml2py, root.xpath("//params/param/value")))
+    return method_name, args
+
+
+def decode_response(body, validation=VALIDATION_FULL, huge_tree=False):
+    """ Returns the params and the fault of
+    the ``methodResponse`` body """
+
+    root = parse_xml(body, validation, huge_tree=huge_tree)
+
+    if validation == VALIDATION_STRUCTURAL:
+        return parse_response(root)
+
+    result = root.xpath("//params/param/value")
+    if result:
+        return list(map(xml2py, result)), None
+
+    fault = root.xpath("//fault/value")
+    if fault:
+        return [], xml2py(fault[0])
+
+    return [], None
+
+
+def success_tree(value):
+    xml_response = etree.Element("methodResponse")
+    xml_params = etree.Element("params")
+    xml_param = etree.Element("param")
+    xml_value = etree.Element("value")
+
+    xml_value.append(value)
+    xml_param.append(xml_value)
+    xml_params.append(xml_param)
+    xml_response.append(xml_params)
+    return xml_response
+
+
+def encode_response(result, serializer="lxml", pretty_print=False):
+    if serializer == "text":
+        return dump_response(result)
+
+    return etree.tostring(
+        success_tree(py2xml(result)),
+        xml_declaration=True,
+        encoding="utf-8",
+        pretty_print=pretty_print,
+    )
+
+
+JOB_SUCCESS = 0
+JOB_ERROR = 1
+JOB_INVALID = 2
+
+
+def run_batch(jobs):
+    results = []
+
+    for func, args in jobs:
+        # lxml exceptions can not be pickled, so only
+        # the messages are sent back from the worker
+        try:
+            results.append((JOB_SUCCESS, func(*args)))
+        except etree.DocumentInvalid as e:
+            results.append((JOB_INVALID, str(e)))
+        except etree.LxmlError as e:
+            results.append((JOB_ERROR, ValueError(str(e))))
+        except Exception as e:
+            results.append((JOB_ERROR, e))
+
+    return results
+
+
+class ProcessPoolCodec:
+    """ Decodes and encodes the big payloads in the worker processes,
+    so the pure python tree walks are not limited by the GIL of the
+    event loop process. Jobs submitted during the same event loop
+    iteration are sent to the pool as one batch, until the batch
+    reaches ``batch_size`` jobs or ``batch_bytes`` bytes of payload.
+
+    Only the payloads bigger than ``threshold`` bytes are offloaded. """
+
+    def __init__(
+        self, executor=None, max_workers=None, threshold=64 * 1024,
+        batch_size=32, batch_bytes=1024 * 1024
+    ):
+        self.executor = executor or ProcessPoolExecutor(max_workers)
+        self.threshold = threshold
+        self.batch_size = batch_size
+        self.batch_bytes = batch_bytes
+
+        self._batch = []
+        self._batch_size = 0
+        self._handle = None
+
+    def submit(self, size, func, *args):
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+
+        if self._batch and self._batch_size + size > self.batch_bytes:
+            self._flush()
+
+        self._batch.append((future, func, args))
+        self._batch_size += size
+
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+        elif self._handle is None:
+            self._handle = loop.call_soon(self._flush)
+
+        return future
+
+    def _flush(self):
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+        batch, self._batch, self._batch_size = self._batch, [], 0
+
+        if not batch:
+            return
+
+        futures = [future for future, _, _ in batch]
+        jobs = [(func, args) for _, func, args in batch]
+
+        loop = asyncio.get_event_loop()
+        result = loop.run_in_executor(self.executor, run_batch, jobs)
+        result.add_done_callback(
+            lambda result: self._resolve(futures, result),
+        )
+
+    @staticmethod
+    def _resolve(futures, result):
+        if result.cancelled() or result.exception() is not None:
+            for future in futures:
+                if future.done():
+                    continue
+                if result.cancelled():
+                    future.cancel()
+                else:
+                    future.set_exception(result.exception())
+            return
+
+        for future, (status, value) in zip(futures, result.result()):
+            if future.done():
+                continue
+            if status == JOB_SUCCESS:
+                future.set_result(value)
+            elif status == JOB_INVALID:
+                future.set_exception(etree.DocumentInvalid(value))
+            else:
+                future.set_exception(value)
+
+    def decode_call(self, body, validation=VALIDATION_FULL):
+        return self.submit(len(body), decode_call, body, validation)
+
+    def decode_response(self, body, validation=VALIDATION_FULL, huge_tree=False):
+        return self.submit(
+            len(body), decode_response, body, validation, huge_tree,
+        )
+
+    def encode_response(self, result, serializer="lxml", pretty_print=False):
+        # Size of the result is unknown, so it is never batched
+        return self.submit(
+            self.batch_bytes, encode_response, result, serializer,
+            pretty_print,
+        )
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+
+__all__ = (
+    "ProcessPoolCodec", "decode_call", "decode_response", "encode_response",
+)
@@ -1,7 +1,9 @@
 import asyncio
 import base64
+import inspect
 import logging
 import os
+import re
 from builtins import ValueError
 from datetime import datetime
 from functools import singledispatch, wraps
@@ -20,6 +22,12 @@ TIME_FORMAT = "%Y%m%dT%H:%M:%S"
 TIME_FORMATS = [TIME_FORMAT, "%Y%m%dT%H%M%S"]
 PY2XML_TYPES = {}
 XML2PY_TYPES = {}
+TEXT2PY_TYPES = {}
+PY2TEXT_WRITERS = {}
+
+XML_DECLARATION = "<?xml version='1.0' encoding='{0}'?>\n"
+ARRAY_TYPES = (list, tuple, set, frozenset, GeneratorType)
+INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
 
 schema = etree.RelaxNG(file=os.path.join(CURRENT_DIR, "xmlrpc.rng"))
 
@@ -136,57 +144,259 @@ def _(x):
     return struct
 
 
+def xml_escape(value):
+    if INVALID_XML_CHARS.search(value) is not None:
+        raise ValueError(
+            "All strings must be XML compatible: Unicode or ASCII, "
+            "no NULL bytes or control characters",
+        )
+
+    # Same escaping as the lxml serializer does for the text nodes
+    if "&" in value:
+        value = value.replace("&", "&amp;")
+    if "<" in value:
+        value = value.replace("<", "&lt;")
+    if ">" in value:
+        value = value.replace(">", "&gt;")
+    if "\r" in value:
+        value = value.replace("\r", "&#13;")
+
+    return value
+
+
+def register_py2text(*types):
+    """ Register text writer for the types. The writer is bound to the
+    :func:`py2xml` implementation registered for the type, so types
+    overridden via ``@py2xml.register`` still go through ``py2xml``. """
+
+    def decorator(func):
+        for type_ in types:
+            PY2TEXT_WRITERS[py2xml.dispatch(type_)] = func
+        return func
+
+    return decorator
+
+
+def py2text(value, chunks):
+    """ Serialise value the same way as :func:`py2xml` does, but append
+    the XML text to the ``chunks`` list instead of building elements. """
+
+    impl = py2xml.dispatch(value.__class__)
+    writer = PY2TEXT_WRITERS.get(impl)
+
+    if writer is None:
+        chunks.append(etree.tostring(impl(value), encoding="unicode"))
+        return
+
+    writer(value, chunks)
+
+
+@register_py2text(bytes)
+def _(value, chunks):
+    chunks.append("<string>%s</string>" % xml_escape(value.decode()))
+
+
+@register_py2text(str)
+def _(value, chunks):
+    chunks.append("<string>%s</string>" % xml_escape(value))
+
+
+@register_py2text(float)
+def _(value, chunks):
+    chunks.append("<double>%r</double>" % value)
+
+
+@register_py2text(datetime)
+def _(value, chunks):
+    chunks.append(
+        "<dateTime.iso8601>%s</dateTime.iso8601>" % value.strftime(TIME_FORMAT),
+    )
+
+
+@register_py2text(int)
+def _(value, chunks):
+    if -2147483648 < value < 2147483647:
+        chunks.append("<i4>%d</i4>" % value)
+    else:
+        chunks.append("<double>%d</double>" % value)
+
+
+@register_py2text(Binary)
+def _(value, chunks):
+    chunks.append("<base64>%s</base64>" % base64.b64encode(value).decode())
+
+
+@register_py2text(bool)
+def _(value, chunks):
+    chunks.append("<boolean>1</boolean>" if value else "<boolean>0</boolean>")
+
+
+@register_py2text(NoneType)
+def _(value, chunks):
+    chunks.append("<nil/>")
+
+
+@register_py2text(*ARRAY_TYPES)
+def _(x, chunks):
+    append = chunks.append
+    append("<array><data>")
+    size = len(chunks)
+
+    for item in x:
+        append("<value>")
+        py2text(item, chunks)
+        append("</value>")
+
+    if len(chunks) == size:
+        chunks[-1] = "<array><data/></array>"
+    else:
+        append("</data></array>")
+
+
+@register_py2text(dict)
+def _(x, chunks):
+    if not x:
+        chunks.append("<struct/>")
+        return
+
+    append = chunks.append
+    append("<struct>")
+
+    for key, value in x.items():
+        append("<member><name>%s</name><value>" % xml_escape(str(key)))
+        py2text(value, chunks)
+        append("</value></member>")
+
+    append("</struct>")
+
+
+def dump_request(method_name, args, encoding=None):
+    chunks = [
+        XML_DECLARATION.format(encoding or "ASCII"),
+        "<methodCall><methodName>%s</methodName><params>" % xml_escape(method_name),
+    ]
+
+    for arg in args:
+        chunks.append("<param><value>")
+        py2text(arg, chunks)
+        chunks.append("</value></param>")
+
+    chunks.append("</params></methodCall>")
+    return "".join(chunks).encode(encoding or "ascii", "xmlcharrefreplace")
+
+
+def dump_response(result, encoding="utf-8"):
+    chunks = [
+        XML_DECLARATION.format(encoding),
+        "<methodResponse><params><param><value>",
+    ]
+    py2text(result, chunks)
+    chunks.append("</value></param></params></methodResponse>")
+    return "".join(chunks).encode(encoding, "xmlcharrefreplace")
+
+
+def dump_fault(exception, encoding="utf-8"):
+    chunks = [
+        XML_DECLARATION.format(encoding),
+        "<methodResponse><fault><value>",
+    ]
+    py2text(exception, chunks)
+    chunks.append("</value></fault></methodResponse>")
+    return "".join(chunks).encode(encoding, "xmlcharrefreplace")
+
+
 def str_to_time(x):
     for format in TIME_FORMATS:
         try:
-            return datetime.strptime(x.text, format)
+            return datetime.strptime(x, format)
         except ValueError:
             pass
 
     raise ValueError("It's impossible to parse dataetime with formats %s", TIME_FORMATS)
 
 
-def xml2py(value):
-    def xml2struct(p):
-        return dict(
-            map(
-                lambda x: (x[0].text, x[1]),
-                zip(
-                    p.xpath("./member/name"),
-                    map(xml2py, p.xpath("./member/value")),
-                ),
-            ),
-        )
+def xml2struct(p):
+    result = {}
 
-    def xml2array(p):
-        return list(map(xml2py, p.xpath("./data/value")))
+    for member in p.iterchildren("member"):
+        # Positional access is much cheaper than path lookups, so
+        # the slow path is taken only for members with extra nodes
+        if len(member) == 2 and member[0].tag == "name":
+            name, value = member
+        else:
+            name, value = member.find("name"), member.find("value")
 
-    def unwrap_value(p):
-        try:
-            value = next(p.iterchildren())
-        except StopIteration:
-            value = p.text or ''
-        return xml2py(value)
-
-    XML2PY_TYPES.update({
-        "string": lambda x: str(x.text or "").strip(),
-        "struct": xml2struct,
-        "array": xml2array,
-        "base64": lambda x: Binary.fromstring(x.text),
-        "boolean": lambda x: bool(int(x.text)),
-        "dateTime.iso8601": lambda x: str_to_time(x),
-        "double": lambda x: float(x.text),
-        "integer": lambda x: int(x.text),
-        "int": lambda x: int(x.text),
-        "i4": lambda x: int(x.text),
-        "nil": lambda x: None,
-        "value": unwrap_value,
-    })
+        result[name.text] = xml2py(value)
+
+    return result
+
+
+def xml2array(p):
+    data = p.find("data")
 
+    if data is None:
+        return []
+
+    return [xml2py(item) for item in data.iterchildren("value")]
+
+
+def unwrap_value(p):
+    if len(p):
+        return xml2py(p[0])
+
+    return (p.text or "").strip()
+
+
+def register_xml2py(tag):
+    """ Register converter for the XML-RPC value tag. The converter
+    receives an element and returns the python value, nested values
+    should be converted with the :func:`xml2py` call. """
+
+    def decorator(func):
+        # The text only fast path is not valid for the tag anymore
+        TEXT2PY_TYPES.pop(tag, None)
+        XML2PY_TYPES[tag] = func
+        return func
+
+    return decorator
+
+
+def text_converter(func):
+    def converter(x):
+        return func(x.text)
+    return converter
+
+
+# Scalar types are converted from the element text only, so the
+# same converters are shared by the tree and the stream decoders
+TEXT2PY_TYPES.update({
+    "string": lambda x: str(x or "").strip(),
+    "base64": Binary.fromstring,
+    "boolean": lambda x: bool(int(x)),
+    "dateTime.iso8601": str_to_time,
+    "double": float,
+    "integer": int,
+    "int": int,
+    "i4": int,
+    "nil": lambda x: None,
+})
+
+XML2PY_TYPES.update({
+    tag: text_converter(func) for tag, func in TEXT2PY_TYPES.items()
+})
+
+XML2PY_TYPES.update({
+    "struct": xml2struct,
+    "array": xml2array,
+    "value": unwrap_value,
+})
+
+
+def xml2py(value):
     if isinstance(value, str):
         return value.strip()
 
-    return XML2PY_TYPES.get(value.tag)(value)
+    return XML2PY_TYPES[value.tag](value)
 
 
 def awaitable(func):
@@ -201,9 +411,10 @@ def awaitable(func):
     def wrap(*args, **kwargs):
         result = func(*args, **kwargs)
 
-        if hasattr(result, "__await__"):
-            return result
-        if asyncio.iscoroutine(result) or asyncio.isfuture(result):
+        # asyncio.iscoroutine() is true for plain generators too, but
+        # they are array values here as well as the async generators
+        # which are consumed while the response is being encoded
+        if inspect.isawaitable(result):
             return result
 
         return awaiter(result)
@@ -211,4 +422,7 @@ def awaitable(func):
     return wrap
 
 
-__all__ = ("py2xml", "xml2py", "schema", "awaitable")
+__all__ = (
+    "py2xml", "py2text", "xml2py", "register_py2text", "register_xml2py",
+    "dump_request", "dump_response", "dump_fault", "schema", "awaitable",
+)
@@ -0,0 +1,51 @@
+import zlib
+
+
+GZIP = "gzip"
+DEFLATE = "deflate"
+
+# In the order of preference
+ENCODINGS = (GZIP, DEFLATE)
+
+
+def compress(data, encoding=GZIP, level=6):
+    if encoding not in ENCODINGS:
+        raise ValueError("Unsupported content encoding %r" % encoding)
+
+    wbits = 16 + zlib.MAX_WBITS if encoding == GZIP else zlib.MAX_WBITS
+    compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+    return compressor.compress(data) + compressor.flush()
+
+
+def accepted_encoding(header):
+    """ Returns the preferred encoding allowed by
+    the ``Accept-Encoding`` header or None """
+
+    accepted, rejected = set(), set()
+
+    for item in (header or "").lower().split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip()
+        params = params.replace(" ", "")
+
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    rejected.add(coding)
+                    continue
+            except ValueError:
+                continue
+
+        if coding == "*":
+            accepted.update(ENCODINGS)
+
+        accepted.add(coding)
+
+    for encoding in ENCODINGS:
+        if encoding in accepted and encoding not in rejected:
+            return encoding
+
+    return None
+
+
+__all__ = ("DEFLATE", "ENCODINGS", "GZIP", "accepted_encoding", "compress")
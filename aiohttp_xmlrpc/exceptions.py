@@ -1,6 +1,4 @@
-from lxml import etree
-
-from .common import py2xml
+from .common import py2text, py2xml, register_py2text
 
 
 __all__ = (
@@ -107,28 +105,22 @@ def xml2py_exception(code: int, fault: str, default_exc_class=XMLRPCError):
     return exc(fault)
 
 
-@py2xml.register(Exception)
-def _(value):
-    code, reason = __EXCEPTION_TYPES[Exception], repr(value)
+def fault_struct(exception: BaseException):
+    code = __EXCEPTION_TYPES[Exception]
 
-    for klass in value.__class__.__mro__:
+    for klass in exception.__class__.__mro__:
         if klass in __EXCEPTION_TYPES:
             code = __EXCEPTION_TYPES[klass]
             break
 
-    struct = etree.Element("struct")
+    return {"faultCode": code, "faultString": repr(exception)}
 
-    for key, value in (("faultCode", code), ("faultString", reason)):
-        member = etree.Element("member")
-        struct.append(member)
 
-        key_el = etree.Element("name")
-        key_el.text = key
-        member.append(key_el)
+@py2xml.register(Exception)
+def _(value):
+    return py2xml(fault_struct(value))
 
-        value_el = etree.Element("value")
-        value_el.append(py2xml(value))
-        member.append(value_el)
 
-    # struct.attrib['error'] = '1'
-    return struct
+@register_py2text(Exception)
+def _(value, chunks):
+    py2text(fault_struct(value), chunks)
@@ -4,16 +4,32 @@ import logging
 from abc import ABCMeta
 from types import MappingProxyType
 
-from aiohttp.web import HTTPBadRequest, HTTPError, Response, View
+from aiohttp.web import (
+    HTTPBadRequest, HTTPError, Response, StreamResponse, View,
+)
 from lxml import etree
 
 from . import exceptions
-from .common import awaitable, py2xml, schema, xml2py
+from .codec import decode_call, success_tree
+from .compression import accepted_encoding, compress
+from .common import (
+    ARRAY_TYPES, XML_DECLARATION, awaitable, dump_fault, dump_response,
+    py2text, py2xml,
+)
+from .exceptions import fault_struct
+from .validation import VALIDATION_FULL, check_mode
 
 
 log = logging.getLogger(__name__)
 
 
+def rename(new_name):
+    def decorator(func):
+        func.__xmlrpc_name__ = new_name
+        return func
+    return decorator
+
+
 # noinspection PyUnresolvedReferences
 class XMLRPCViewMeta(ABCMeta):
     def __new__(cls, clsname, superclasses, attributedict):
@@ -35,6 +51,8 @@ class XMLRPCViewMeta(ABCMeta):
             cls, clsname, superclasses, attributedict,
         )
 
+        check_mode(instance.VALIDATION)
+
         argmapping = getattr(instance, mapping_key)
         allowed_methods = getattr(instance, allowed_key)
 
@@ -74,16 +92,67 @@ class XMLRPCView(View, metaclass=XMLRPCViewMeta):
     DEBUG = False
     THREAD_POOL_EXECUTOR = None
 
+    # Requests bigger than this are parsed and decoded in the executor,
+    # their responses and the results with more items than
+    # THREAD_POOL_RESULT_ITEMS are encoded there as well
+    THREAD_POOL_THRESHOLD = 64 * 1024
+    THREAD_POOL_RESULT_ITEMS = 1024
+
+    # codec.ProcessPoolCodec instance, offloads the payloads above its
+    # threshold to the worker processes instead of the thread pool
+    PROCESS_POOL = None
+
+    # "lxml" builds the element tree, "text" writes the XML text directly
+    SERIALIZER = "lxml"
+
+    # Write the response with the chunked transfer encoding while
+    # serialising it. Always uses the "text" serializer.
+    STREAM_RESPONSE = False
+    STREAM_CHUNK_SIZE = 64 * 1024
+
+    # "full" validates requests with the RelaxNG schema, "structural"
+    # checks the structure while decoding, "off" skips the checks
+    VALIDATION = VALIDATION_FULL
+
+    # How many system.multicall sub-calls run concurrently,
+    # None removes the limit
+    MULTICALL_CONCURRENCY = 1
+
+    # Responses bigger than this are compressed when the client
+    # accepts gzip or deflate, None disables the compression.
+    # Request bodies with Content-Encoding are decoded by aiohttp.
+    COMPRESS_THRESHOLD = None
+    COMPRESS_LEVEL = 6
+
+    _offload = False
+
     async def post(self, *args, **kwargs):
+        response = None
+
         try:
+            if self.STREAM_RESPONSE:
+                response = StreamResponse()
+
+                if self._response_encoding() is not None:
+                    response.enable_compression()
+
+                result = await self._execute()
+                return await self._stream_response(response, result)
+
             xml_response = await self._handle()
         except HTTPError:
             raise
         except Exception as e:
+            # Headers are already sent, so the only option is to abort
+            if response is not None and response.prepared:
+                raise
+
             xml_response = self._format_error(e)
             log.exception(e)
 
-        return self._make_response(xml_response)
+        return await self._compress_response(
+            self._make_response(xml_response),
+        )
 
     @classmethod
     def _make_response(cls, xml_response, status=200, reason=None):
@@ -97,17 +166,125 @@ class XMLRPCView(View, metaclass=XMLRPCViewMeta):
         response.body = xml_data
         return response
 
-    async def _parse_body(self, body):
+    def _response_encoding(self):
+        if self.COMPRESS_THRESHOLD is None:
+            return None
+
+        return accepted_encoding(self.request.headers.get("Accept-Encoding"))
+
+    async def _compress_response(self, response):
+        encoding = self._response_encoding()
+        body = response.body
+
+        if encoding is None or len(body) < self.COMPRESS_THRESHOLD:
+            return response
+
+        if len(body) > self.THREAD_POOL_THRESHOLD:
+            body = await self._run_in_executor(
+                compress, body, encoding, self.COMPRESS_LEVEL,
+            )
+        else:
+            body = compress(body, encoding, self.COMPRESS_LEVEL)
+
+        response.body = body
+        response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        return response
+
+    async def _stream_response(self, response, result):
+        response.headers["Content-Type"] = "text/xml; charset=utf-8"
+
+        chunks = [
+            XML_DECLARATION.format("utf-8"),
+            "<methodResponse><params><param><value>",
+        ]
+
+        if hasattr(result, "__aiter__"):
+            chunks.append("<array><data>")
+
+            async for item in result:
+                chunks.append("<value>")
+                py2text(item, chunks)
+                chunks.append("</value>")
+                chunks = await self._write_chunks(response, chunks)
+
+            chunks.append("</data></array>")
+        elif isinstance(result, ARRAY_TYPES):
+            chunks.append("<array><data>")
+
+            for item in result:
+                chunks.append("<value>")
+                py2text(item, chunks)
+                chunks.append("</value>")
+                chunks = await self._write_chunks(response, chunks)
+
+            chunks.append("</data></array>")
+        else:
+            py2text(result, chunks)
+
+        chunks.append("</value></param></params></methodResponse>")
+        await self._write_chunks(response, chunks, force=True)
+        await response.write_eof()
+        return response
+
+    async def _write_chunks(self, response, chunks, force=False):
+        if len(chunks) < 1024 and not force:
+            return chunks
+
+        data = "".join(chunks)
+
+        if len(data) < self.STREAM_CHUNK_SIZE and not force:
+            return [data]
+
+        # Response is prepared as late as possible, so the errors
+        # raised before the first write are still sent as faults
+        if not response.prepared:
+            await response.prepare(self.request)
+
+        await response.write(data.encode("utf-8", "xmlcharrefreplace"))
+        return []
+
+    def _run_in_executor(self, func, *args):
         loop = asyncio.get_event_loop()
+        return loop.run_in_executor(self.THREAD_POOL_EXECUTOR, func, *args)
+
+    async def _parse_body(self, body):
+        pool = self.PROCESS_POOL
+
+        if pool is not None and len(body) > pool.threshold:
+            self._offload = True
+
+            try:
+                return await pool.decode_call(body, self.VALIDATION)
+            except etree.DocumentInvalid:
+                raise HTTPBadRequest
+
+        # The thread switch costs more than parsing of the small bodies
+        self._offload = len(body) > self.THREAD_POOL_THRESHOLD
+
+        if self._offload:
+            return await self._run_in_executor(self._decode_request, body)
+
+        return self._decode_request(body)
+
+    def _decode_request(self, body):
         try:
-            return await loop.run_in_executor(
-                self.THREAD_POOL_EXECUTOR,
-                self._parse_xml,
-                body,
-            )
+            return decode_call(body, self.VALIDATION)
         except etree.DocumentInvalid:
             raise HTTPBadRequest
 
+    def _is_large_result(self, result):
+        if self._offload:
+            return True
+
+        if isinstance(result, (str, bytes)):
+            return len(result) > self.THREAD_POOL_THRESHOLD
+
+        if isinstance(result, (list, tuple, set, frozenset, dict)):
+            return len(result) > self.THREAD_POOL_RESULT_ITEMS
+
+        return False
+
     # noinspection PyUnresolvedReferences
     def _lookup_method(self, method_name):
         if method_name not in self.__allowed_methods__:
@@ -122,12 +299,33 @@ class XMLRPCView(View, metaclass=XMLRPCViewMeta):
             raise HTTPBadRequest
 
     async def _handle(self):
+        result = await self._execute()
+
+        if hasattr(result, "__aiter__"):
+            return await self._format_async_success(result)
+
+        if self._is_large_result(result):
+            if self.PROCESS_POOL is not None:
+                return await self.PROCESS_POOL.encode_response(
+                    result, self.SERIALIZER, self.DEBUG,
+                )
+
+            return await self._run_in_executor(self._encode_success, result)
+
+        return self._format_success(result)
+
+    @classmethod
+    def _encode_success(cls, result):
+        return cls._build_xml(cls._format_success(result))
+
+    async def _execute(self):
         self._check_request()
 
         body = await self.request.read()
-        xml_request = await self._parse_body(body)
+        method_name, args = await self._parse_body(body)
+        return await self._call(method_name, args)
 
-        method_name = xml_request.xpath("//methodName[1]")[0].text
+    async def _call(self, method_name, args):
         method = self._lookup_method(method_name)
 
         log.info(
@@ -138,36 +336,97 @@ class XMLRPCView(View, metaclass=XMLRPCViewMeta):
             method.__name__,
         )
 
-        args = list(
-            map(
-                xml2py,
-                xml_request.xpath("//params/param/value"),
-            ),
-        )
-
         kwargs = {}
         argspec = self.__method_arg_mapping__[method_name]
         if argspec.varkw or argspec.kwonlyargs and isinstance(args[-1], dict):
             kwargs = args.pop(-1)
 
-        result = await method(*args, **kwargs)
-        return self._format_success(result)
+        return await method(*args, **kwargs)
 
-    @staticmethod
-    def _format_success(result):
-        xml_response = etree.Element("methodResponse")
-        xml_params = etree.Element("params")
-        xml_param = etree.Element("param")
-        xml_value = etree.Element("value")
+    async def _multicall_item(self, call):
+        try:
+            if not isinstance(call, dict) or "methodName" not in call:
+                raise exceptions.InvalidData(
+                    "system.multicall expects structs with methodName and params",
+                )
 
-        xml_value.append(py2xml(result))
-        xml_param.append(xml_value)
-        xml_params.append(xml_param)
-        xml_response.append(xml_params)
-        return xml_response
+            method_name = call["methodName"]
+            if method_name == "system.multicall":
+                raise exceptions.ApplicationError(
+                    "Recursive system.multicall is forbidden",
+                )
+
+            result = await self._call(method_name, list(call.get("params", [])))
+
+            if hasattr(result, "__aiter__"):
+                result = [item async for item in result]
+        except HTTPError:
+            raise
+        except Exception as e:
+            log.exception(e)
+            return fault_struct(e)
+
+        return [result]
+
+    @rename("system.multicall")
+    async def rpc_system_multicall(self, calls):
+        if self.MULTICALL_CONCURRENCY == 1:
+            return [await self._multicall_item(call) for call in calls]
+
+        if self.MULTICALL_CONCURRENCY is None:
+            return await asyncio.gather(*map(self._multicall_item, calls))
+
+        semaphore = asyncio.Semaphore(self.MULTICALL_CONCURRENCY)
+
+        async def limited(call):
+            async with semaphore:
+                return await self._multicall_item(call)
+
+        return await asyncio.gather(*map(limited, calls))
+
+    @classmethod
+    def _format_success(cls, result):
+        if cls.SERIALIZER == "text":
+            return dump_response(result)
+
+        return cls._success_tree(py2xml(result))
+
+    @classmethod
+    async def _format_async_success(cls, result):
+        # Items are encoded as soon as they are produced,
+        # so only the serialised form is kept in memory
+        if cls.SERIALIZER == "text":
+            chunks = [
+                XML_DECLARATION.format("utf-8"),
+                "<methodResponse><params><param><value><array><data>",
+            ]
+
+            async for item in result:
+                chunks.append("<value>")
+                py2text(item, chunks)
+                chunks.append("</value>")
+
+            chunks.append("</data></array></value></param></params></methodResponse>")
+            return "".join(chunks).encode("utf-8", "xmlcharrefreplace")
+
+        array = etree.Element("array")
+        data = etree.Element("data")
+        array.append(data)
+
+        async for item in result:
+            value = etree.Element("value")
+            value.append(py2xml(item))
+            data.append(value)
+
+        return cls._success_tree(array)
+
+    _success_tree = staticmethod(success_tree)
+
+    @classmethod
+    def _format_error(cls, exception: Exception):
+        if cls.SERIALIZER == "text":
+            return dump_fault(exception)
 
-    @staticmethod
-    def _format_error(exception: Exception):
         xml_response = etree.Element("methodResponse")
         xml_fault = etree.Element("fault")
         xml_value = etree.Element("value")
@@ -177,15 +436,12 @@ class XMLRPCView(View, metaclass=XMLRPCViewMeta):
         xml_response.append(xml_fault)
         return xml_response
 
-    @staticmethod
-    def _parse_xml(xml_string):
-        parser = etree.XMLParser(resolve_entities=False)
-        root = etree.fromstring(xml_string, parser)
-        schema.assertValid(root)
-        return root
-
     @classmethod
     def _build_xml(cls, tree):
+        # Already serialised by the "text" serializer
+        if isinstance(tree, bytes):
+            return tree
+
         return etree.tostring(
             tree,
             xml_declaration=True,
@@ -193,9 +449,3 @@ class XMLRPCView(View, metaclass=XMLRPCViewMeta):
             pretty_print=cls.DEBUG,
         )
 
-
-def rename(new_name):
-    def decorator(func):
-        func.__xmlrpc_name__ = new_name
-        return func
-    return decorator
@@ -0,0 +1,154 @@
+from collections import deque
+
+from lxml import etree
+
+from .common import TEXT2PY_TYPES, XML2PY_TYPES
+
+
+_EMPTY = object()
+
+ENVELOPE_TAGS = frozenset((
+    "methodCall", "methodName", "methodResponse",
+    "params", "param", "fault", "data",
+))
+
+
+class StreamDecoder:
+    """ lxml parser target which converts XML-RPC values while the
+    document is being fed. No element tree is built, so the memory
+    usage depends on the nesting depth and not on the payload size.
+
+    When ``iterate`` is set, the items of the top level arrays are not
+    collected, but queued to :attr:`items` as soon as each one is
+    complete. """
+
+    def __init__(self, iterate=False):
+        self.method_name = None
+        self.params = []
+        self.fault = None
+        self.items = deque() if iterate else None
+
+        self._is_fault = False
+        self._containers = []
+        self._names = []
+        self._text = []
+        self._value = _EMPTY
+
+        # Tree builder for the values with custom converters
+        self._builder = None
+        self._depth = 0
+
+    def start(self, tag, attrib):
+        if self._builder is not None:
+            self._depth += 1
+            self._builder.start(tag, attrib)
+            return
+
+        self._text = []
+
+        if tag == "value":
+            self._value = _EMPTY
+        elif tag == "array":
+            self._containers.append([])
+        elif tag == "struct":
+            self._containers.append({})
+        elif tag == "member":
+            self._names.append(None)
+        elif tag == "fault":
+            self._is_fault = True
+        elif tag in TEXT2PY_TYPES or tag == "name" or tag in ENVELOPE_TAGS:
+            pass
+        elif tag in XML2PY_TYPES:
+            self._builder = etree.TreeBuilder()
+            self._builder.start(tag, attrib)
+            self._depth = 1
+        else:
+            raise ValueError("Unexpected tag %r" % tag)
+
+    def data(self, data):
+        if self._builder is not None:
+            self._builder.data(data)
+            return
+
+        self._text.append(data)
+
+    def end(self, tag):
+        if self._builder is not None:
+            self._builder.end(tag)
+            self._depth -= 1
+
+            if not self._depth:
+                element = self._builder.close()
+                self._builder = None
+                self._value = XML2PY_TYPES[tag](element)
+            return
+
+        if tag == "value":
+            value = self._value
+            self._value = _EMPTY
+
+            if value is _EMPTY:
+                value = "".join(self._text).strip()
+
+            self._emit(value)
+        elif tag in TEXT2PY_TYPES:
+            self._value = TEXT2PY_TYPES[tag]("".join(self._text))
+        elif tag == "array" or tag == "struct":
+            self._value = self._containers.pop()
+        elif tag == "name":
+            self._names[-1] = "".join(self._text)
+        elif tag == "member":
+            self._names.pop()
+        elif tag == "methodName":
+            self.method_name = "".join(self._text).strip()
+
+    def _emit(self, value):
+        if not self._containers:
+            if self._is_fault:
+                self.fault = value
+            else:
+                self.params.append(value)
+            return
+
+        container = self._containers[-1]
+
+        if container.__class__ is list:
+            if (
+                self.items is not None and
+                len(self._containers) == 1 and
+                not self._is_fault
+            ):
+                self.items.append(value)
+                return
+
+            container.append(value)
+        else:
+            container[self._names[-1]] = value
+
+    def close(self):
+        return self
+
+
+class StreamParser:
+    """ Incremental XML-RPC document parser. Feed it with the raw
+    chunks as they arrive and call :meth:`close` to get the
+    :class:`StreamDecoder` with the decoded values. """
+
+    __slots__ = "decoder", "parser"
+
+    def __init__(self, huge_tree=False, iterate=False):
+        self.decoder = StreamDecoder(iterate=iterate)
+        self.parser = etree.XMLParser(
+            target=self.decoder,
+            huge_tree=huge_tree,
+            resolve_entities=False,
+        )
+
+    def feed(self, data):
+        self.parser.feed(data)
+
+    def close(self):
+        return self.parser.close()
+
+
+__all__ = ("StreamDecoder", "StreamParser")
@@ -0,0 +1,315 @@
+import base64
+import binascii
+import re
+
+from lxml import etree
+
+from .common import TEXT2PY_TYPES, XML2PY_TYPES, Binary, schema
+
+
+VALIDATION_FULL = "full"
+VALIDATION_STRUCTURAL = "structural"
+VALIDATION_OFF = "off"
+
+VALIDATION_MODES = frozenset((
+    VALIDATION_FULL, VALIDATION_STRUCTURAL, VALIDATION_OFF,
+))
+
+METHOD_NAME = re.compile(r"^[a-zA-Z0-9_.:/]+$")
+INTEGER = re.compile(r"^\s*[+-]?[0-9]+\s*$")
+DOUBLE = re.compile(
+    r"^\s*([+-]?([0-9]+(\.[0-9]*)?|\.[0-9]+)([eE][+-]?[0-9]+)?|[+-]?INF|NaN)\s*$",
+)
+
+# Default xml2py converter -> strict converter for the same tag
+STRICT_CONVERTERS = {}
+
+
+def invalid(message, element):
+    raise etree.DocumentInvalid(
+        "{0}, line {1}".format(message, element.sourceline),
+    )
+
+
+def make_parser(**kwargs):
+    # Comments and processing instructions are dropped by the parser,
+    # so the checks below can rely on the element children only
+    return etree.XMLParser(remove_comments=True, remove_pis=True, **kwargs)
+
+
+def check_blank(text, element):
+    if text is not None and not text.isspace():
+        invalid("Did not expect text in element %s" % element.tag, element)
+
+
+def check_leaf(p):
+    if len(p):
+        invalid("Did not expect element %s there" % p[0].tag, p)
+
+
+def strict_integer(p):
+    check_leaf(p)
+
+    if p.text is None or INTEGER.match(p.text) is None:
+        invalid("Type int doesn't allow value %r" % p.text, p)
+
+    value = int(p.text)
+
+    if not -2147483648 <= value <= 2147483647:
+        invalid("Type int doesn't allow value %r" % p.text, p)
+
+    return value
+
+
+def strict_double(p):
+    check_leaf(p)
+
+    if p.text is None or DOUBLE.match(p.text) is None:
+        invalid("Type double doesn't allow value %r" % p.text, p)
+
+    return float(p.text)
+
+
+def strict_boolean(p):
+    check_leaf(p)
+
+    value = (p.text or "").strip()
+    if value != "0" and value != "1":
+        invalid("Type boolean doesn't allow value %r" % p.text, p)
+
+    return value == "1"
+
+
+def strict_base64(p):
+    check_leaf(p)
+
+    try:
+        return Binary(
+            base64.b64decode("".join((p.text or "").split()), validate=True),
+        )
+    except (binascii.Error, ValueError):
+        invalid("Type base64Binary doesn't allow value", p)
+
+
+def strict_datetime(p):
+    check_leaf(p)
+
+    try:
+        return TEXT2PY_TYPES["dateTime.iso8601"](p.text)
+    except (TypeError, ValueError):
+        invalid("Type dateTime doesn't allow value %r" % p.text, p)
+
+
+def strict_string(p):
+    check_leaf(p)
+    return TEXT2PY_TYPES["string"](p.text)
+
+
+def strict_nil(p):
+    check_leaf(p)
+    check_blank(p.text, p)
+
+
+def strict_struct(p):
+    result = {}
+    check_blank(p.text, p)
+
+    for member in p:
+        if member.tag != "member" or len(member) != 2:
+            invalid("Expecting member element with name and value", member)
+
+        name, value = member
+
+        if name.tag != "name" or value.tag != "value":
+            invalid("Expecting name and value elements", member)
+
+        check_leaf(name)
+        check_blank(member.text, member)
+        check_blank(name.tail, member)
+        check_blank(value.tail, member)
+        check_blank(member.tail, p)
+
+        result[name.text or ""] = xml2py_strict(value)
+
+    return result
+
+
+def strict_array(p):
+    if len(p) != 1 or p[0].tag != "data":
+        invalid("Expecting a single data element", p)
+
+    data = p[0]
+    check_blank(p.text, p)
+    check_blank(data.tail, p)
+    check_blank(data.text, data)
+
+    result = []
+
+    for value in data:
+        if value.tag != "value":
+            invalid("Did not expect element %s there" % value.tag, value)
+
+        check_blank(value.tail, data)
+        result.append(xml2py_strict(value))
+
+    return result
+
+
+def strict_value(p):
+    if not len(p):
+        return (p.text or "").strip()
+
+    if len(p) > 1:
+        invalid("Did not expect element %s there" % p[1].tag, p)
+
+    child = p[0]
+    check_blank(p.text, p)
+    check_blank(child.tail, p)
+    return xml2py_strict(child)
+
+
+STRICT_CONVERTERS.update({
+    XML2PY_TYPES[tag]: converter for tag, converter in (
+        ("string", strict_string),
+        ("struct", strict_struct),
+        ("array", strict_array),
+        ("base64", strict_base64),
+        ("boolean", strict_boolean),
+        ("dateTime.iso8601", strict_datetime),
+        ("double", strict_double),
+        ("integer", strict_integer),
+        ("int", strict_integer),
+        ("i4", strict_integer),
+        ("nil", strict_nil),
+        ("value", strict_value),
+    )
+})
+
+
+def xml2py_strict(value):
+    """ Convert the element like :func:`xml2py` does, checking the
+    structure in the same pass. Raises :class:`lxml.etree.DocumentInvalid`
+    for the documents the RelaxNG schema rejects. Tags registered via
+    :func:`register_xml2py` are converted with their own converters. """
+
+    converter = XML2PY_TYPES.get(value.tag)
+
+    if converter is None:
+        invalid("Did not expect element %s there" % value.tag, value)
+
+    return STRICT_CONVERTERS.get(converter, converter)(value)
+
+
+def check_params(params):
+    check_blank(params.text, params)
+
+    result = []
+
+    for param in params:
+        if param.tag != "param" or len(param) != 1 or param[0].tag != "value":
+            invalid("Expecting param element with a single value", param)
+
+        check_blank(param.text, param)
+        check_blank(param[0].tail, param)
+        check_blank(param.tail, params)
+        result.append(xml2py_strict(param[0]))
+
+    return result
+
+
+def parse_call(root):
+    """ Returns the method name and the converted params of the
+    ``methodCall`` document parsed with :func:`make_parser` """
+
+    if root.tag != "methodCall":
+        invalid("Expecting element methodCall, got %s" % root.tag, root)
+
+    if not 0 < len(root) < 3 or root[0].tag != "methodName":
+        invalid("Expecting element methodName", root)
+
+    method_name = root[0]
+    check_leaf(method_name)
+    check_blank(root.text, root)
+    check_blank(method_name.tail, root)
+
+    if METHOD_NAME.match(method_name.text or "") is None:
+        invalid("Error validating datatype string", method_name)
+
+    args = []
+
+    if len(root) == 2:
+        params = root[1]
+
+        if params.tag != "params":
+            invalid("Did not expect element %s there" % params.tag, root)
+
+        check_blank(params.tail, root)
+        args = check_params(params)
+
+    return method_name.text, args
+
+
+def parse_response(root):
+    """ Returns the converted params and the fault of the
+    ``methodResponse`` document parsed with :func:`make_parser` """
+
+    if root.tag != "methodResponse":
+        invalid("Expecting element methodResponse, got %s" % root.tag, root)
+
+    if len(root) != 1:
+        invalid("Expecting a single params or fault element", root)
+
+    child = root[0]
+    check_blank(root.text, root)
+    check_blank(child.tail, root)
+
+    if child.tag == "params":
+        params = check_params(child)
+
+        if len(params) != 1:
+            invalid("Expecting a single param element", child)
+
+        return params, None
+
+    if child.tag != "fault":
+        invalid("Did not expect element %s there" % child.tag, root)
+
+    if len(child) != 1 or child[0].tag != "value":
+        invalid("Expecting a single value element", child)
+
+    check_blank(child.text, child)
+    check_blank(child[0].tail, child)
+    fault = xml2py_strict(child[0])
+
+    if (
+        not isinstance(fault, dict) or
+        set(fault) != {"faultCode", "faultString"} or
+        not isinstance(fault["faultCode"], int) or
+        isinstance(fault["faultCode"], bool) or
+        not isinstance(fault["faultString"], str)
+    ):
+        invalid("Invalid fault structure", child[0])
+
+    return [], fault
+
+
+def validate(root, mode):
+    if mode == VALIDATION_FULL:
+        schema.assertValid(root)
+
+
+def check_mode(mode):
+    if mode not in VALIDATION_MODES:
+        raise ValueError(
+            "Validation mode must be one of %s" % ", ".join(
+                sorted(VALIDATION_MODES),
+            ),
+        )
+
+    return mode
+
+
+__all__ = (
+    "VALIDATION_FULL", "VALIDATION_STRUCTURAL", "VALIDATION_OFF",
+    "parse_call", "parse_response", "xml2py_strict",
+)
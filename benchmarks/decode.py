@@ -0,0 +1,43 @@
+"""
+Decoder micro-benchmark: converts big arrays and structs with
+``xml2py`` and prints the best time of several runs.
+
+    python benchmarks/decode.py
+"""
+import timeit
+from datetime import datetime
+
+from aiohttp_xmlrpc.common import py2xml, xml2py
+
+
+ROW = {
+    "id": 42,
+    "name": "Something here",
+    "price": 12.5,
+    "active": True,
+    "created": datetime(2020, 1, 1, 12, 30, 0),
+    "tags": ["foo", "bar", "baz"],
+}
+
+CASES = {
+    "array of 10k structs": [ROW] * 10000,
+    "array of 100k ints": list(range(100000)),
+    "struct of 10k members": {"key%d" % i: i for i in range(10000)},
+}
+
+
+def main(repeat=5, number=3):
+    for name, value in CASES.items():
+        element = py2xml(value)
+        best = min(
+            timeit.repeat(
+                lambda: xml2py(element),
+                repeat=repeat, number=number,
+            ),
+        ) / number
+
+        print("%-24s %10.2f ms" % (name, best * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Encoder micro-benchmark: serialises a big method response with the
+"lxml" and the "text" serializers of ``XMLRPCView``.
+
+    python benchmarks/encode.py
+"""
+import timeit
+from datetime import datetime
+
+from aiohttp_xmlrpc.handler import XMLRPCView
+
+
+ROW = {
+    "id": 42,
+    "name": "Something <here>",
+    "price": 12.5,
+    "active": True,
+    "created": datetime(2020, 1, 1, 12, 30, 0),
+    "tags": ["foo", "bar", "baz"],
+}
+
+CASES = {
+    "array of 10k structs": [ROW] * 10000,
+    "array of 100k ints": list(range(100000)),
+    "struct of 10k members": {"key%d" % i: i for i in range(10000)},
+}
+
+
+class LxmlView(XMLRPCView):
+    SERIALIZER = "lxml"
+
+
+class TextView(XMLRPCView):
+    SERIALIZER = "text"
+
+
+def encode(view, value):
+    return view._build_xml(view._format_success(value))
+
+
+def main(repeat=5, number=3):
+    for name, value in CASES.items():
+        for view in (LxmlView, TextView):
+            best = min(
+                timeit.repeat(
+                    lambda: encode(view, value),
+                    repeat=repeat, number=number,
+                ),
+            ) / number
+
+            print("%-24s %-10s %10.2f ms" % (name, view.SERIALIZER, best * 1000))
+
+
+if __name__ == "__main__":
+    main()
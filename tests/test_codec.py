@@ -0,0 +1,86 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pytest
+from aiohttp_xmlrpc.codec import ProcessPoolCodec, decode_call
+from aiohttp_xmlrpc.common import dump_request, dump_response
+from lxml import etree
+
+
+pytest_plugins = (
+    "aiohttp.pytest_plugin",
+)
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(max_workers=1)
+        self.calls = 0
+
+    def submit(self, *args, **kwargs):
+        self.calls += 1
+        return super().submit(*args, **kwargs)
+
+
+def test_decode_call():
+    body = dump_request("test", (1, {"a": [2]}))
+    assert decode_call(body) == ("test", [1, {"a": [2]}])
+    assert decode_call(body, "structural") == ("test", [1, {"a": [2]}])
+
+
+async def test_batching():
+    executor = CountingExecutor()
+    codec = ProcessPoolCodec(executor=executor, batch_size=3)
+
+    bodies = [dump_request("test", (idx,)) for idx in range(5)]
+    results = await asyncio.gather(*[codec.decode_call(body) for body in bodies])
+
+    assert results == [("test", [idx]) for idx in range(5)]
+    assert executor.calls == 2
+
+    codec.shutdown()
+
+
+async def test_batch_bytes():
+    executor = CountingExecutor()
+    body = dump_request("test", ("x" * 100,))
+    codec = ProcessPoolCodec(executor=executor, batch_bytes=len(body) * 2)
+
+    await asyncio.gather(*[codec.decode_call(body) for _ in range(4)])
+    assert executor.calls == 2
+
+    codec.shutdown()
+
+
+async def test_errors():
+    codec = ProcessPoolCodec(executor=ThreadPoolExecutor(max_workers=1))
+
+    invalid = codec.decode_call(b"<methodCall><params/></methodCall>")
+    broken = codec.decode_call(b"<methodCall>")
+    valid = codec.decode_call(dump_request("test", ()))
+
+    with pytest.raises(etree.DocumentInvalid):
+        await invalid
+
+    with pytest.raises(ValueError):
+        await broken
+
+    assert await valid == ("test", [])
+
+    codec.shutdown()
+
+
+async def test_process_pool():
+    codec = ProcessPoolCodec(executor=ProcessPoolExecutor(max_workers=1))
+    value = [{"idx": idx, "name": "<%d>" % idx} for idx in range(100)]
+
+    params, fault = await codec.decode_response(dump_response(value))
+    assert params == [value]
+    assert fault is None
+
+    assert await codec.encode_response(value, "text") == dump_response(value)
+
+    with pytest.raises(etree.DocumentInvalid):
+        await codec.decode_response(b"<methodResponse/>")
+
+    codec.shutdown()
@@ -2,7 +2,10 @@ from datetime import datetime
 
 import pytest
 import xmltodict
-from aiohttp_xmlrpc.common import Binary, py2xml, xml2py
+from aiohttp_xmlrpc.common import (
+    XML2PY_TYPES, Binary, dump_request, py2text, py2xml, register_xml2py,
+    xml2py,
+)
 from lxml import etree
 
 
@@ -165,3 +168,65 @@ def test_py2xml(data, expected):
     _b = normalise_dict(xmltodict.parse(b))
 
     assert _a == _b, "\n %s \n not equal \n %s" % (a.decode(), b)
+
+
+def test_xml2py_pretty_struct():
+    data = etree.fromstring(
+        "<struct>\n"
+        "  <member>\n"
+        "    <name>foo</name>\n"
+        "    <!-- comment -->\n"
+        "    <value><i4>1</i4></value>\n"
+        "  </member>\n"
+        "  <member><name>bar</name><value>baz</value></member>\n"
+        "</struct>",
+    )
+    assert xml2py(data) == {"foo": 1, "bar": "baz"}
+
+
+def test_register_xml2py():
+    @register_xml2py("custom")
+    def _(x):
+        return x.text[::-1]
+
+    try:
+        data = etree.fromstring("<value><custom>olleh</custom></value>")
+        assert xml2py(data) == "hello"
+    finally:
+        XML2PY_TYPES.pop("custom")
+
+
+@pytest.mark.parametrize("data,expected", CASES)
+def test_py2text(data, expected):
+    chunks = []
+    py2text(data, chunks)
+    assert "".join(chunks) == etree.tostring(py2xml(data), encoding="unicode")
+
+
+@pytest.mark.parametrize("value", [
+    "<&>\r \u00e9", [], {}, [[], {}], {"<": Binary(b"")}, 2 ** 40,
+    ValueError("error"),
+])
+def test_py2text_compat(value):
+    chunks = []
+    py2text(value, chunks)
+    assert "".join(chunks) == etree.tostring(py2xml(value), encoding="unicode")
+
+
+def test_py2text_invalid_chars():
+    with pytest.raises(ValueError):
+        py2text("\x00", [])
+
+
+def test_dump_request():
+    root = etree.Element("methodCall")
+    etree.SubElement(root, "methodName").text = "test"
+    params = etree.SubElement(root, "params")
+    for arg in (1, "\u00e9"):
+        value = etree.SubElement(etree.SubElement(params, "param"), "value")
+        value.append(py2xml(arg))
+
+    for encoding in (None, "utf-8"):
+        assert dump_request("test", (1, "\u00e9"), encoding) == etree.tostring(
+            root, xml_declaration=True, encoding=encoding,
+        )
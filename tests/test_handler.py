@@ -1,9 +1,15 @@
 import asyncio
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 from aiohttp import web
 from aiohttp_xmlrpc import handler
+from aiohttp_xmlrpc.client import MultiCall
+from aiohttp_xmlrpc.codec import ProcessPoolCodec
+from aiohttp_xmlrpc.compression import (
+    DEFLATE, GZIP, accepted_encoding, compress,
+)
 from aiohttp_xmlrpc.exceptions import ApplicationError
 from lxml import etree
 from lxml.builder import E
@@ -54,6 +60,14 @@ class XMLRPCMain(handler.XMLRPCView):
     def rpc_dict_kw_only_args(self, d, *, foo, **kw):
         return (d, foo, kw)
 
+    def rpc_range(self, count):
+        return [{"idx": idx} for idx in range(count)]
+
+    async def rpc_async_range(self, count):
+        for idx in range(count):
+            await asyncio.sleep(0)
+            yield {"idx": idx}
+
     @rename("method_with.new_name")
     def rpc_renamed(self):
         return "renamed_function"
@@ -69,10 +83,81 @@ class XMLRPCChild(XMLRPCMain):
         return "My name has the nested format and I am in child class"
 
 
+class XMLRPCText(XMLRPCMain):
+    SERIALIZER = "text"
+    VALIDATION = "structural"
+
+
+class XMLRPCStreamed(XMLRPCMain):
+    STREAM_RESPONSE = True
+    STREAM_CHUNK_SIZE = 1024
+
+    def rpc_generator(self, count):
+        return ({"idx": idx} for idx in range(count))
+
+    async def rpc_async_generator(self, count):
+        for idx in range(count):
+            await asyncio.sleep(0)
+            yield {"idx": idx}
+
+    def rpc_broken_generator(self, count):
+        for idx in range(count):
+            yield "x" * 100
+
+        raise ValueError("broken")
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(max_workers=1)
+        self.calls = 0
+
+    def submit(self, *args, **kwargs):
+        self.calls += 1
+        return super().submit(*args, **kwargs)
+
+
+class XMLRPCConcurrent(XMLRPCMain):
+    MULTICALL_CONCURRENCY = 2
+
+    async def rpc_sleep(self, value):
+        await asyncio.sleep(0.01)
+        return value
+
+
+class XMLRPCCounted(XMLRPCConcurrent):
+    requests = 0
+
+    async def post(self, *args, **kwargs):
+        XMLRPCCounted.requests += 1
+        return await super().post(*args, **kwargs)
+
+
+class XMLRPCCompressed(XMLRPCMain):
+    COMPRESS_THRESHOLD = 256
+
+
+class XMLRPCCompressedStream(XMLRPCCompressed):
+    STREAM_RESPONSE = True
+
+
+class XMLRPCOffload(XMLRPCMain):
+    THREAD_POOL_EXECUTOR = CountingExecutor()
+    THREAD_POOL_THRESHOLD = 1024
+    THREAD_POOL_RESULT_ITEMS = 100
+
+
 def create_app(loop):
     app = web.Application()
     app.router.add_route("*", "/", XMLRPCMain)
     app.router.add_route("*", "/clone", XMLRPCChild)
+    app.router.add_route("*", "/text", XMLRPCText)
+    app.router.add_route("*", "/streamed", XMLRPCStreamed)
+    app.router.add_route("*", "/offload", XMLRPCOffload)
+    app.router.add_route("*", "/concurrent", XMLRPCConcurrent)
+    app.router.add_route("*", "/counted", XMLRPCCounted)
+    app.router.add_route("*", "/compressed", XMLRPCCompressed)
+    app.router.add_route("*", "/compressed-stream", XMLRPCCompressedStream)
     return app
 
 
@@ -237,3 +322,264 @@ async def test_15_nested_method_in_child(aiohttp_xmlrpc_client):
 
     result = await client.child.test()
     assert result == "My name has the nested format and I am in child class"
+
+
+async def test_16_streaming_client(aiohttp_xmlrpc_client):
+    client = await aiohttp_xmlrpc_client(create_app, streaming=True)
+
+    result = await client.args_kwargs(1, 2, 3, foo=1)
+    assert result == 4
+
+    result = await client.dict_args(41, 42, {"foo": "bar"})
+    assert result == [41, 42, {"foo": "bar"}]
+
+    with pytest.raises(ApplicationError):
+        await client.unknown_method()
+
+
+async def test_17_stream_items(client):
+    result = [item async for item in client.stream.range(1000)]
+    assert result == [{"idx": idx} for idx in range(1000)]
+
+    result = [item async for item in client.stream.args(1, 2)]
+    assert result == [2]
+
+    with pytest.raises(ApplicationError):
+        async for _ in client.stream.unknown_method():
+            pass
+
+
+async def test_18_text_serializer(aiohttp_xmlrpc_client):
+    client = await aiohttp_xmlrpc_client(
+        create_app, path="/text", serializer="text", validation="structural",
+    )
+
+    result = await client.dict_kw_only_args(
+        {"foo": "<bar>"}, foo=32, spam="egg",
+    )
+    assert result == [{"foo": "<bar>"}, 32, {"spam": "egg"}]
+
+    result = await client.range(3)
+    assert result == [{"idx": 0}, {"idx": 1}, {"idx": 2}]
+
+    with pytest.raises(ApplicationError):
+        await client.unknown_method()
+
+
+async def test_19_stream_response(aiohttp_xmlrpc_client):
+    client = await aiohttp_xmlrpc_client(create_app, path="/streamed")
+    expected = [{"idx": idx} for idx in range(5000)]
+
+    assert await client.range(5000) == expected
+    assert await client.generator(5000) == expected
+    assert await client.async_generator(5000) == expected
+    assert [x async for x in client.stream.generator(5000)] == expected
+
+    assert await client.args(1, 2) == 2
+    assert await client.test() is None
+
+    with pytest.raises(ApplicationError):
+        await client.unknown_method()
+
+    # Error before anything was written is reported as a fault
+    with pytest.raises(Exception, match="broken"):
+        await client.broken_generator(1)
+
+    # Error after the first chunk aborts the response
+    with pytest.raises(Exception):
+        await client.broken_generator(5000)
+
+
+@pytest.mark.parametrize("path", ["/", "/text"])
+async def test_20_async_generator(aiohttp_xmlrpc_client, path):
+    client = await aiohttp_xmlrpc_client(create_app, path=path)
+
+    result = await client.async_range(100)
+    assert result == [{"idx": idx} for idx in range(100)]
+
+    assert await client.async_range(0) == []
+
+
+async def test_21_structural_validation(aiohttp_client):
+    client = await aiohttp_client(create_app)
+
+    for path, status in (("/", 400), ("/text", 400)):
+        async with client.post(
+            path,
+            data=(
+                "<methodCall><methodName>args</methodName><params>"
+                "<param><value><i4>x</i4></value></param>"
+                "</params></methodCall>"
+            ),
+            headers={"Content-Type": "text/xml"},
+        ) as resp:
+            assert resp.status == status
+
+
+def test_22_validation_mode():
+    with pytest.raises(ValueError):
+        type("View", (handler.XMLRPCView,), {"VALIDATION": "partial"})
+
+
+async def test_23_executor_threshold(aiohttp_xmlrpc_client):
+    client = await aiohttp_xmlrpc_client(create_app, path="/offload")
+    executor = XMLRPCOffload.THREAD_POOL_EXECUTOR
+    executor.calls = 0
+
+    # Small request and small response never leave the loop
+    assert await client.args(1, 2) == 2
+    assert executor.calls == 0
+
+    # Big result is encoded in the executor
+    assert len(await client.range(200)) == 200
+    assert executor.calls == 1
+
+    # Big request is decoded and its response is encoded in the executor
+    assert await client.args(*range(1000)) == 1000
+    assert executor.calls == 3
+
+
+async def test_24_process_pool(aiohttp_xmlrpc_client, monkeypatch):
+    codec = ProcessPoolCodec(max_workers=2, threshold=0)
+    monkeypatch.setattr(XMLRPCMain, "PROCESS_POOL", codec)
+
+    try:
+        client = await aiohttp_xmlrpc_client(create_app, process_pool=codec)
+
+        results = await asyncio.gather(
+            client.range(2000), client.args(*range(100)),
+            client.dict_kwargs({"foo": "bar"}, spam="egg"),
+        )
+        assert results == [
+            [{"idx": idx} for idx in range(2000)], 100,
+            [{"foo": "bar"}, {"spam": "egg"}],
+        ]
+
+        with pytest.raises(ApplicationError):
+            await client.unknown_method()
+    finally:
+        codec.shutdown()
+
+
+async def test_25_multicall(client):
+    multicall = MultiCall(client)
+    multicall.args(1, 2, 3)
+    multicall.kwargs(foo=1, bar=2)
+    multicall.unknown_method()
+    multicall.method_with.new_name()
+    multicall.async_range(2)
+    multicall.system.multicall([])
+
+    results = await multicall()
+    assert len(results) == 6
+    assert results[0] == 3
+    assert results[1] == 2
+    assert results[3] == "renamed_function"
+    assert results[4] == [{"idx": 0}, {"idx": 1}]
+
+    with pytest.raises(ApplicationError):
+        results[2]
+
+    with pytest.raises(ApplicationError):
+        results[5]
+
+    assert len(await multicall()) == 0
+
+
+async def test_26_multicall_concurrent(aiohttp_xmlrpc_client):
+    client = await aiohttp_xmlrpc_client(create_app, path="/concurrent")
+
+    async with MultiCall(client) as multicall:
+        for idx in range(10):
+            multicall.sleep(idx)
+        multicall.exception()
+
+    results = multicall.results
+    assert [results[idx] for idx in range(10)] == list(range(10))
+
+    with pytest.raises(Exception, match="YEEEEEE"):
+        results[10]
+
+    result = await client.system.multicall([{"params": []}, "junk"])
+    assert [item["faultCode"] for item in result] == [-32600, -32600]
+
+
+async def test_27_coalesce(aiohttp_xmlrpc_client):
+    client = await aiohttp_xmlrpc_client(
+        create_app, path="/counted", coalesce_window=0.01, coalesce_size=8,
+    )
+    XMLRPCCounted.requests = 0
+
+    results = await asyncio.gather(
+        *[client.sleep(idx) for idx in range(20)],
+        client.kwargs(foo=1, bar=2),
+        client.exception(),
+        return_exceptions=True,
+    )
+
+    assert results[:21] == list(range(20)) + [2]
+    assert "YEEEEEE" in str(results[21])
+    assert XMLRPCCounted.requests == 3
+
+    # A single call is sent as is
+    assert await client.sleep(1) == 1
+    assert XMLRPCCounted.requests == 4
+
+    with pytest.raises(ApplicationError):
+        await client.unknown_method()
+
+
+@pytest.mark.parametrize("path", ["/compressed", "/compressed-stream"])
+async def test_28_compression(aiohttp_xmlrpc_client, path):
+    client = await aiohttp_xmlrpc_client(
+        create_app, path=path, compress_threshold=0,
+    )
+
+    assert await client.args(*range(100)) == 100
+    assert await client.range(1000) == [{"idx": i} for i in range(1000)]
+    assert await client.test() is None
+
+
+async def test_29_compression_negotiation(aiohttp_client):
+    session = await aiohttp_client(create_app)
+    body = etree.tostring(
+        E.methodCall(
+            E.methodName("range"),
+            E.params(E.param(E.value(E.int("100")))),
+        ),
+        xml_declaration=True,
+    )
+
+    async def post(path, encoding):
+        response = await session.post(
+            path, data=compress(body, GZIP),
+            headers={
+                "Content-Type": "text/xml",
+                "Content-Encoding": GZIP,
+                "Accept-Encoding": encoding,
+            },
+        )
+        assert response.status == 200
+        assert b"<name>idx</name>" in await response.read()
+        return response.headers.get("Content-Encoding")
+
+    assert await post("/compressed", "gzip, deflate") == "gzip"
+    assert await post("/compressed", "gzip;q=0, deflate") == "deflate"
+    assert await post("/compressed", "identity") is None
+    assert await post("/", "gzip") is None
+
+
+@pytest.mark.parametrize(
+    "header,expected", [
+        (None, None),
+        ("", None),
+        ("deflate, gzip", GZIP),
+        ("br, deflate", DEFLATE),
+        ("*", GZIP),
+        ("*, gzip;q=0", DEFLATE),
+        ("gzip; q=0.5", GZIP),
+        ("gzip;q=0.0, deflate;q=0", None),
+    ],
+)
+def test_accepted_encoding(header, expected):
+    assert accepted_encoding(header) == expected
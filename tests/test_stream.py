@@ -0,0 +1,101 @@
+import pytest
+from aiohttp_xmlrpc.common import XML2PY_TYPES, py2xml, register_xml2py
+from aiohttp_xmlrpc.stream import StreamParser
+from lxml import etree
+
+from .test_common import CASES, CASES_COMPAT
+
+
+def response(value, wrap=True):
+    if wrap:
+        value = "<value>{}</value>".format(value)
+
+    return (
+        "<?xml version='1.0'?>"
+        "<methodResponse><params><param>"
+        "{}"
+        "</param></params></methodResponse>"
+    ).format(value).encode()
+
+
+def feed(body, chunk_size=7):
+    parser = StreamParser()
+
+    for idx in range(0, len(body), chunk_size):
+        parser.feed(body[idx:idx + chunk_size])
+
+    return parser.close()
+
+
+@pytest.mark.parametrize("expected,data", CASES)
+def test_stream_decode(expected, data):
+    decoder = feed(response(data))
+    assert decoder.params == [expected]
+    assert decoder.fault is None
+
+
+@pytest.mark.parametrize("expected,data", CASES_COMPAT)
+def test_stream_decode_compat(expected, data):
+    decoder = feed(response(data, wrap=False))
+    assert decoder.params == [expected]
+
+
+def test_stream_decode_nested():
+    value = [{"foo": [1, {"bar": None}], "baz": "spam"}, [], {}]
+    body = response(etree.tostring(py2xml(value)).decode())
+    assert feed(body, chunk_size=3).params == [value]
+
+
+def test_stream_decode_fault():
+    body = (
+        b"<methodResponse><fault><value><struct>"
+        b"<member><name>faultCode</name><value><int>1</int></value></member>"
+        b"<member><name>faultString</name><value>Err</value></member>"
+        b"</struct></value></fault></methodResponse>"
+    )
+    decoder = feed(body)
+    assert decoder.params == []
+    assert decoder.fault == {"faultCode": 1, "faultString": "Err"}
+
+
+def test_stream_decode_method_call():
+    body = (
+        b"<methodCall><methodName>foo.bar</methodName><params>"
+        b"<param><value><i4>1</i4></value></param>"
+        b"<param><value>two</value></param>"
+        b"</params></methodCall>"
+    )
+    decoder = feed(body)
+    assert decoder.method_name == "foo.bar"
+    assert decoder.params == [1, "two"]
+
+
+def test_stream_decode_custom_tag():
+    @register_xml2py("pair")
+    def _(x):
+        return tuple(item.text for item in x)
+
+    try:
+        decoder = feed(response("<pair><a>1</a><b>2</b></pair>"))
+        assert decoder.params == [("1", "2")]
+    finally:
+        XML2PY_TYPES.pop("pair")
+
+
+def test_stream_decode_unknown_tag():
+    with pytest.raises(ValueError):
+        feed(response("<unknown>1</unknown>"))
+
+
+def test_stream_decode_iterate():
+    body = response(etree.tostring(py2xml([1, [2, 3], {"a": [4]}])).decode())
+    parser = StreamParser(iterate=True)
+
+    items = []
+    for idx in range(len(body)):
+        parser.feed(body[idx:idx + 1])
+        items.extend(parser.decoder.items)
+        parser.decoder.items.clear()
+
+    assert items == [1, [2, 3], {"a": [4]}]
+    assert parser.close().params == [[]]
@@ -0,0 +1,106 @@
+import pytest
+from aiohttp_xmlrpc.common import schema, xml2py
+from aiohttp_xmlrpc.validation import make_parser, parse_call, parse_response
+from lxml import etree
+
+
+RESPONSE = (
+    "<methodResponse><params><param>"
+    "<value>{}</value>"
+    "</param></params></methodResponse>"
+)
+
+FAULT = (
+    "<methodResponse><fault><value><struct>"
+    "<member><name>faultCode</name><value>{}</value></member>"
+    "<member><name>faultString</name><value>Error</value></member>"
+    "</struct></value></fault></methodResponse>"
+)
+
+VALUES = [
+    "text", " <i4> 1 </i4> ", "<i4>+1</i4>", "<i4>1_0</i4>", "<i4>a</i4>",
+    "<i4>2147483648</i4>", "<int>-2147483648</int>", "<double>1e5</double>",
+    "<double>inf</double>", "<double>INF</double>", "<double>.5</double>",
+    "<double>5.</double>", "<boolean> 1 </boolean>", "<boolean>2</boolean>",
+    "<base64>aGk=\n</base64>", "<base64>a</base64>", "<nil> </nil>",
+    "<nil>x</nil>", "<string><b/></string>", "x<i4>1</i4>",
+    "<i4>1</i4><i4>1</i4>", "<!--c--><i4>1</i4>", "<unknown/>",
+    "<dateTime.iso8601>20200101T00:00:00</dateTime.iso8601>",
+    "<struct><member><name>a</name><value>1</value></member></struct>",
+    "<struct><member><value>1</value><name>a</name></member></struct>",
+    "<struct><member><name>a</name></member></struct>",
+    "<struct>x</struct>", "<struct><value/></struct>",
+    "<array><data><value>1</value><value><i4>2</i4></value></data></array>",
+    "<array><data/><data/></array>", "<array/>",
+    "<array><data><i4>1</i4></data></array>",
+]
+
+CALLS = [
+    "<methodCall><methodName>a.b</methodName></methodCall>",
+    "<methodCall><methodName>a b</methodName></methodCall>",
+    "<methodCall><methodName>a</methodName><params/></methodCall>",
+    "<methodCall><params/></methodCall>",
+    "<methodCall><methodName>a</methodName><param/></methodCall>",
+    (
+        "<methodCall><methodName>a</methodName><params>"
+        "<param><value>1</value></param>"
+        "<param><value><i4>2</i4></value></param>"
+        "</params></methodCall>"
+    ),
+    (
+        "<methodCall><methodName>a</methodName><params>"
+        "<param><value>1</value><value>2</value></param>"
+        "</params></methodCall>"
+    ),
+]
+
+RESPONSES = [RESPONSE.format(value) for value in VALUES] + [
+    FAULT.format("<i4>1</i4>"),
+    FAULT.format("<string>1</string>"),
+    "<methodResponse><params/></methodResponse>",
+    "<methodResponse><fault/></methodResponse>",
+    "<methodResponse/>",
+]
+
+
+def schema_valid(root):
+    try:
+        schema.assertValid(root)
+    except etree.DocumentInvalid:
+        return False
+
+    return True
+
+
+def structural_valid(root, parse):
+    try:
+        parse(root)
+    except etree.DocumentInvalid:
+        return False
+
+    return True
+
+
+@pytest.mark.parametrize("document", CALLS)
+def test_parse_call(document):
+    root = etree.fromstring(document, make_parser())
+    assert schema_valid(root) == structural_valid(root, parse_call)
+
+
+@pytest.mark.parametrize("document", RESPONSES)
+def test_parse_response(document):
+    root = etree.fromstring(document, make_parser())
+    assert schema_valid(root) == structural_valid(root, parse_response)
+
+
+@pytest.mark.parametrize("value", [
+    value for value in VALUES if schema_valid(
+        etree.fromstring(RESPONSE.format(value), make_parser()),
+    )
+])
+def test_parse_response_values(value):
+    root = etree.fromstring(RESPONSE.format(value), make_parser())
+    params, fault = parse_response(root)
+
+    assert fault is None
+    assert params == [xml2py(root.find("params/param/value"))]